@@ -1,6 +1,7 @@
 import atexit
 import shutil
 import sys
+import tempfile
 from os import PathLike
 from pathlib import Path
 
@@ -16,15 +17,16 @@ class Unsilence:
     Unsilence Class to remove (or isolate or many other use cases) silence from audible video parts
     """
 
-    def __init__(self, input_file: str | PathLike, temp_dir: str | PathLike = Path(".tmp")):
+    def __init__(self, input_file: str | PathLike, temp_dir: str | PathLike | None = None):
         """
         :param input_file: The file that should be processed
         :type input_file: str | PathLike
-        :param temp_dir: The temp dir where temporary files can be saved
-        :type temp_dir: str | PathLike
+        :param temp_dir: The temp dir where temporary files can be saved. Defaults to a new private directory in
+            /dev/shm (if it exists and has at least four times the size of the input file free), so that temporary
+            files are kept in memory, otherwise to .tmp
+        :type temp_dir: str | PathLike | None
         """
         self._input_file = Path(input_file)
-        self._temp_dir = Path(temp_dir)
         self._intervals: Intervals | None = None
 
         ffmpeg_status = is_ffmpeg_usable()
@@ -36,8 +38,35 @@ class Unsilence:
             print("Could not detect ffmpeg version, proceed at your own risk! (version >= 4.2.4 required)",
                   file=sys.stderr)
 
+        self._temp_dir = Path(temp_dir) if temp_dir is not None else self._get_default_temp_dir()
         atexit.register(self.cleanup)
 
+    def _get_default_temp_dir(self):
+        """
+        Gets the default temp dir. /dev/shm is a memory backed file system, so temporary files written there never
+        hit the disk. It is shared by all users, so a new directory only accessible by the current user is created
+        there with a random name.
+
+        The re-encoded intervals can be larger than the input file and the combined output is written to the temp dir
+        as well, while running out of space would only show up as corrupted intervals. So /dev/shm is only used if
+        it has more than four times the size of the input file available, otherwise the temporary files are saved
+        to .tmp
+
+        :return: The default temp dir
+        :rtype: Path
+        """
+        shm_path = Path("/dev/shm")
+
+        if shm_path.is_dir():
+            try:
+                required_space = 4 * self._input_file.stat().st_size
+                if shutil.disk_usage(shm_path).free > required_space:
+                    return Path(tempfile.mkdtemp(prefix="unsilence-", dir=shm_path))
+            except OSError:
+                pass
+
+        return Path(".tmp")
+
     def detect_silence(self, **kwargs):
         """
         Detects silence of the file (Options can be specified in kwargs)
@@ -98,7 +127,7 @@ class Unsilence:
 
         :param output_file: Where the final file should be saved at
         :type output_file: str | PathLike
-        :param `\**kwargs`: Remaining keyword arguments are passed to :func:`~unsilence.lib.render_media.MediaRenderer.MediaRenderer.render`
+        :param `\**kwargs`: Remaining keyword arguments are passed to :func:`~unsilence.lib.render_media.MediaRenderer.MediaRenderer.render_batched`
        
         :return: None
         """
@@ -106,7 +135,7 @@ class Unsilence:
             raise ValueError("Silence detection was not yet run and no intervals where given manually!")
 
         renderer = MediaRenderer(self._temp_dir)
-        renderer.render(self._input_file, output_file, self._intervals, **kwargs)
+        renderer.render_batched(self._input_file, output_file, self._intervals, **kwargs)
 
     def cleanup(self):
         """
@@ -1,4 +1,5 @@
 import argparse
+import os
 from pathlib import Path
 
 
@@ -76,7 +77,7 @@ def parse_arguments():
                         help="Minimum duration of an interval after speedup to ensure correct concatenation")
 
 
-    parser.add_argument("-t", "--threads", type=number_bigger_than_zero, default=2,
+    parser.add_argument("-t", "--threads", type=number_bigger_than_zero, default=os.cpu_count() or 1,
                         help="Number of threads to be used while rendering")
     parser.add_argument("-sl", "--silence-level", type=float, default=-35,
                         help="Minimum volume in decibel to be classified as audible")
@@ -0,0 +1,476 @@
+import asyncio
+import bisect
+import functools
+import itertools
+import os
+import pathlib
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+from unsilence.lib.intervals.Interval import Interval
+
+
+class IntervalRenderer:
+    """
+    Renders/processes intervals based on defined options, every task is rendered by its own ffmpeg subprocess
+    """
+
+    def __init__(self, input_file: pathlib.Path, render_options: SimpleNamespace):
+        """
+        Initializes a new IntervalRenderer
+        :param input_file: The file the renderer should work on
+        :param render_options: The parameters on how the video should be processed
+        """
+        self._input_file = input_file
+        self._render_options = render_options
+
+        # CPython only uses posix_spawn (see _run_ffmpeg) for executables given with a directory, so ffmpeg is
+        # resolved to its absolute path once
+        self._ffmpeg_executable = shutil.which("ffmpeg") or "ffmpeg"
+
+        # Only errors (or warnings when debugging) are logged, the per-frame progress stats are not needed either
+        self._log_arguments = ("-loglevel", "warning" if render_options.debug else "error", "-nostats")
+
+        # Everything after the seek options of an interval or batch command is the same for every ffmpeg call
+        self._input_arguments = (
+            "-i", os.fspath(input_file),
+            "-vsync", "1",
+            "-async", "1",
+            "-safe", "0",
+            "-ignore_unknown", "-y",
+        )
+
+        # The render options do not change while the renderer is alive, so the filters are prepared once as format
+        # templates per interval type, only the interval dependent values are filled in later
+        self._speeds = {True: render_options.silent_speed, False: render_options.audible_speed}
+        self._filter_templates = {}
+        self._batch_filter_templates = {}
+        self._pass_through = {}
+
+        fade_in = self._get_fade_filter(0.0, render_options.interval_in_fade_duration, 0.0, render_options.fade_curve)
+        if fade_in != "":
+            fade_in = f"{fade_in},"
+
+        for is_silent, volume in ((True, render_options.silent_volume), (False, render_options.audible_volume)):
+            # Intervals that are neither sped up, nor change their volume or fade, do not need to be filtered at all
+            self._pass_through[is_silent] = (
+                self._speeds[is_silent] == 1 and volume == 1
+                and fade_in == "" and render_options.interval_out_fade_duration == 0.0
+            )
+
+            audio_filter = f"{fade_in}{{fade_out}}atempo={{speed}},volume={volume}"
+            batch_audio_filter = (
+                f"[0:a]atrim=start={{start}}:end={{end}},asetpts=PTS-STARTPTS,{audio_filter}[a{{index}}]"
+            )
+
+            if render_options.audio_only:
+                self._filter_templates[is_silent] = f"[0:a]{audio_filter}[a]"
+                self._batch_filter_templates[is_silent] = batch_audio_filter
+            else:
+                self._filter_templates[is_silent] = f"[0:v]setpts={{speed_inv}}*PTS[v];[0:a]{audio_filter}[a]"
+                self._batch_filter_templates[is_silent] = (
+                    f"[0:v]trim=start={{start}}:end={{end}},setpts={{speed_inv}}*(PTS-STARTPTS)[v{{index}}];\n"
+                    f"{batch_audio_filter}"
+                )
+
+        self._batch_pass_through_template = "[0:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{index}]"
+        if not render_options.audio_only:
+            self._batch_pass_through_template = (
+                "[0:v]trim=start={start}:end={end},setpts=PTS-STARTPTS[v{index}];\n"
+                f"{self._batch_pass_through_template}"
+            )
+
+    async def render_task(self, task: SimpleNamespace, on_progress=None):
+        """
+        Renders a task, which is either a single interval or a batch of intervals
+        :param task: The task that should be rendered
+        :param on_progress: Function that is called with the number of finished intervals while a batch is rendered
+        :return: Whether the task was rendered successfully (False if it contained a corrupted media part)
+        """
+        if task.intervals is not None:
+            return await self._render_batch(
+                task.interval_output_file,
+                task.intervals,
+                task.filter_script_file,
+                on_progress
+            )
+
+        return await self._render_interval(
+            task.interval_output_file,
+            task.interval,
+            drop_corrupted_intervals=self._render_options.drop_corrupted_intervals,
+            minimum_interval_duration=self._render_options.minimum_interval_duration
+        )
+
+    @staticmethod
+    async def _run_ffmpeg(command: list, on_progress=None):
+        """
+        Runs an ffmpeg command as subprocess without blocking the event loop
+        :param command: The ffmpeg command
+        :param on_progress: Function that is called with the output time (in seconds) of every progress report, only
+                            used if ffmpeg is run with "-progress pipe:1"
+        :return: The return code and the end (last 64 KiB) of the console output (stdout and stderr) of ffmpeg
+        """
+        # Python file descriptors are not inheritable by default, so they do not need to be closed in the child. With
+        # close_fds=False and an absolute executable path CPython can start the process with posix_spawn instead of
+        # fork + exec
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=False,
+        )
+
+        # ffmpeg reports errors at the end of its output, so only the last 64 KiB are kept to bound the memory usage
+        # regardless of how much ffmpeg logs
+        output_tail = bytearray()
+        pending_line = b""
+        while chunk := await process.stdout.read(8192):
+            output_tail += chunk
+            del output_tail[:-65536]
+
+            if on_progress is not None:
+                *lines, pending_line = (pending_line + chunk).split(b"\n")
+                for line in lines:
+                    if line.startswith(b"out_time_us="):
+                        try:
+                            on_progress(int(line[len(b"out_time_us="):]) / 1_000_000)
+                        except ValueError:
+                            # ffmpeg reports "N/A" before the first frame was written
+                            pass
+
+        await process.wait()
+
+        return process.returncode, bytes(output_tail)
+
+    async def _render_interval(self, interval_output_file: pathlib.Path, interval: Interval,
+                               apply_filter=True, drop_corrupted_intervals=False, minimum_interval_duration=0.25):
+        """
+        Renders an interval with the given render options
+        :param interval_output_file: Where the current output file should be saved
+        :param interval: The current Interval that should be processed
+        :param apply_filter: Whether the AV-Filter should be applied or if the media interval should be left untouched
+        :param drop_corrupted_intervals: Whether to remove corrupted frames from the video or keep them in unedited
+        :return: Whether it is corrupted or not
+        """
+
+        command = self._generate_command(interval_output_file, interval, apply_filter, minimum_interval_duration)
+
+        return_code, console_output = await self._run_ffmpeg(command)
+
+        # "Conversion failed!" is not logged at the error log level, so a failed conversion is detected by the return
+        # code, invalid render options are still reported in the output
+        if return_code != 0 and b"Error initializing complex filter" not in console_output:
+            # With check_intervals ffmpeg runs with -xerror, so a failed render means that the interval is invalid and
+            # it is dropped instead of being recovered without filters
+            if drop_corrupted_intervals or self._render_options.check_intervals:
+                return False
+            if apply_filter:
+                return await self._render_interval(
+                    interval_output_file,
+                    interval,
+                    apply_filter=False,
+                    drop_corrupted_intervals=drop_corrupted_intervals,
+                    minimum_interval_duration=minimum_interval_duration
+                )
+            else:
+                raise IOError(f"Input file is corrupted between {interval.start} and {interval.end} (in seconds)")
+
+        if b"Error initializing complex filter" in console_output:
+            raise ValueError("Invalid render options")
+
+        return True
+
+    async def _render_batch(self, batch_output_file: pathlib.Path, intervals: list[Interval],
+                            filter_script_file: pathlib.Path, on_progress=None):
+        """
+        Renders a batch of intervals with a single ffmpeg call, the intervals are cut, filtered and joined in one
+        filter graph
+        :param batch_output_file: Where the joined intervals should be saved
+        :param intervals: The Intervals that should be processed, in order
+        :param filter_script_file: Where the filter graph should be saved for ffmpeg to read it
+        :param on_progress: Function that is called with the number of intervals of the batch that are finished
+        :return: Whether the batch was rendered successfully
+        """
+        # The input is only decoded from the start of the first to the end of the last interval of the batch, so that
+        # every batch ffmpeg call does not have to decode the whole input and drop everything outside of its intervals
+        batch_start = round(intervals[0].start, 6)
+        batch_end = intervals[-1].end
+
+        filter_script_file.write_text(self._generate_batch_filter(intervals, batch_start), encoding="utf8")
+
+        command = [
+            self._ffmpeg_executable,
+            *self._log_arguments,
+            "-ss", self._format_timestamp(batch_start),
+            "-to", self._format_timestamp(batch_end),
+            *self._input_arguments,
+            "-filter_complex_script", f"{filter_script_file}",
+        ]
+
+        report_output_time = None
+        if on_progress is not None:
+            # ffmpeg reports how much of the output is written, which is compared to the output end of every interval
+            minimum_interval_duration = self._render_options.minimum_interval_duration
+            interval_output_ends = list(itertools.accumulate(
+                interval.duration / self.clamp_speed(
+                    interval.duration,
+                    self._speeds[bool(interval.is_silent)],
+                    minimum_interval_duration
+                )
+                for interval in intervals
+            ))
+
+            def report_output_time(output_time: float):
+                on_progress(bisect.bisect_right(interval_output_ends, output_time))
+
+            command.extend(["-progress", "pipe:1"])
+
+        if not self._render_options.audio_only:
+            command.extend(["-map", "[v]"])
+
+        command.extend(["-map", "[a]"])
+
+        if self._render_options.check_intervals:
+            command.append("-xerror")
+
+        command.extend(["-threads", str(self._render_options.ffmpeg_threads)])
+        command.append(str(batch_output_file))
+
+        return_code, _ = await self._run_ffmpeg(command, report_output_time)
+
+        return return_code == 0
+
+    def _generate_batch_filter(self, intervals: list[Interval], input_start: float = 0.0):
+        """
+        Generates a filter graph that cuts every interval out of the input with trim/atrim, applies the speed, volume
+        and fade filter to it and finally concatenates all of them
+        (see https://ffmpeg.org/ffmpeg-filters.html#trim and https://ffmpeg.org/ffmpeg-filters.html#concat)
+        :param intervals: The Intervals that should be processed, in order
+        :param input_start: The time (in seconds) the input was seeked to, the intervals are trimmed relative to it
+        :return: ffmpeg filter graph
+        """
+        # Attribute lookups are bound to locals once instead of once per interval
+        minimum_interval_duration = self._render_options.minimum_interval_duration
+        templates = self._batch_filter_templates
+        pass_through_template = self._batch_pass_through_template
+        is_pass_through = self._is_pass_through
+        fill_filter_template = self._fill_filter_template
+        format_offset = self._format_offset
+
+        filter_chains = [
+            fill_filter_template(
+                pass_through_template if is_pass_through(interval, minimum_interval_duration)
+                else templates[bool(interval.is_silent)],
+                interval,
+                minimum_interval_duration,
+                start=format_offset(interval.start, input_start),
+                end=format_offset(interval.end, input_start),
+                index=i,
+            )
+            for i, interval in enumerate(intervals)
+        ]
+
+        if self._render_options.audio_only:
+            concat_inputs = "".join(f"[a{i}]" for i in range(len(intervals)))
+            filter_chains.append(f"{concat_inputs}concat=n={len(intervals)}:v=0:a=1[a]")
+        else:
+            concat_inputs = "".join(f"[v{i}][a{i}]" for i in range(len(intervals)))
+            filter_chains.append(f"{concat_inputs}concat=n={len(intervals)}:v=1:a=1[v][a]")
+
+        return ";\n".join(filter_chains)
+
+    def _is_pass_through(self, interval: Interval, minimum_interval_duration: float):
+        """
+        Checks whether the interval can be rendered without any filter
+        :param interval: The interval that should be checked
+        :param minimum_interval_duration: Minimum duration of the interval after the speedup
+        :return: Whether the interval can be left unfiltered
+        """
+        # A pass through interval has a speed of 1, which is only changed by clamp_speed for too short intervals
+        return self._pass_through[bool(interval.is_silent)] and interval.duration >= minimum_interval_duration
+
+    def _fill_filter_template(self, template: str, interval: Interval, minimum_interval_duration: float, **kwargs):
+        """
+        Fills a prepared filter template with the speed and fade values of an interval
+        :param template: One of the filter templates prepared in __init__
+        :param interval: The interval the filter is meant for
+        :param minimum_interval_duration: Minimum duration of the interval after the speedup
+        :param kwargs: Additional values for the template
+        :return: ffmpeg filter
+        """
+        render_options = self._render_options
+        duration = interval.duration
+
+        current_speed = IntervalRenderer.clamp_speed(
+            duration,
+            self._speeds[bool(interval.is_silent)],
+            minimum_interval_duration
+        )
+
+        fade_out = self._get_fade_filter(
+            total_duration=duration,
+            interval_in_fade_duration=0.0,
+            interval_out_fade_duration=render_options.interval_out_fade_duration,
+            fade_curve=render_options.fade_curve,
+        )
+
+        if fade_out != "":
+            fade_out = f"{fade_out},"
+
+        return template.format(
+            speed=round(current_speed, 4),
+            speed_inv=round(1 / current_speed, 4),
+            fade_out=fade_out,
+            **kwargs
+        )
+
+    @staticmethod
+    def _get_fade_filter(
+            total_duration: float,
+            interval_in_fade_duration: float,
+            interval_out_fade_duration: float,
+            fade_curve: str,
+    ) -> str:
+
+        if interval_in_fade_duration == 0.0 and interval_out_fade_duration == 0.0:
+            return ""
+
+        return IntervalRenderer._get_fade_filter_template(
+            interval_in_fade_duration,
+            interval_out_fade_duration,
+            fade_curve,
+        ).format(fade_out_start=total_duration - interval_out_fade_duration)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _get_fade_filter_template(
+            interval_in_fade_duration: float,
+            interval_out_fade_duration: float,
+            fade_curve: str,
+    ) -> str:
+        """
+        Generates the fade filter with a placeholder for the only duration dependent value (fade_out_start), the
+        result is cached as the fade options are the same for every interval
+        :param interval_in_fade_duration: Duration of the fade in (seconds)
+        :param interval_out_fade_duration: Duration of the fade out (seconds)
+        :param fade_curve: Curve of the fade, see https://ffmpeg.org/ffmpeg-filters.html#afade-1
+        :return: Fade filter template
+        """
+        res = []
+
+        if interval_in_fade_duration != 0.0:
+            res.append(f"afade=t=in:st=0:d={interval_in_fade_duration:.4f}:curve={fade_curve}")
+
+        if interval_out_fade_duration != 0.0:
+            res.append(
+                f"afade=t=out"
+                f":st={{fade_out_start:.4f}}"
+                f":d={interval_out_fade_duration:.4f}"
+                f":curve={fade_curve}"
+            )
+
+        return ",".join(res)
+
+    def _generate_command(
+            self,
+            interval_output_file: pathlib.Path,
+            interval: Interval, apply_filter: bool,
+            minimum_interval_duration: float,
+    ):
+        """
+        Generates the ffmpeg command to process the video
+        :param interval_output_file: Where the media interval should be saved
+        :param interval: The current interval
+        :param apply_filter: Whether a filter should be applied or not
+        :return: ffmpeg console command
+        """
+        # Attribute lookups are bound to locals once, as this is called for every interval
+        render_options = self._render_options
+        audio_only = render_options.audio_only
+        format_timestamp = self._format_timestamp
+
+        command = [
+            self._ffmpeg_executable,
+            *self._log_arguments,
+            "-ss", format_timestamp(interval.start),
+            "-to", format_timestamp(interval.end),
+            *self._input_arguments,
+        ]
+
+        if apply_filter and self._is_pass_through(interval, minimum_interval_duration):
+            # The streams are still re-encoded, so that all intervals share the same codec parameters for the concat
+            if not audio_only:
+                command.extend(["-map", "0:v:0"])
+
+            command.extend(["-map", "0:a:0"])
+        elif apply_filter:
+            complex_filter = self._fill_filter_template(
+                self._filter_templates[bool(interval.is_silent)],
+                interval,
+                minimum_interval_duration
+            )
+
+            command.extend(["-filter_complex", complex_filter])
+
+            if not audio_only:
+                command.extend(["-map", "[v]"])
+
+            command.extend(["-map", "[a]"])
+        else:
+            fade = self._get_fade_filter(
+                total_duration=interval.duration,
+                interval_in_fade_duration=render_options.interval_in_fade_duration,
+                interval_out_fade_duration=render_options.interval_out_fade_duration,
+                fade_curve=render_options.fade_curve,
+            )
+            if fade != "":
+                command.extend(["-af", fade])
+            if audio_only:
+                command.append("-vn")
+
+        if render_options.check_intervals:
+            # With -xerror ffmpeg exits with an error code on any error, so no additional ffprobe check is needed
+            command.append("-xerror")
+
+        command.extend(["-threads", str(render_options.ffmpeg_threads)])
+        command.append(str(interval_output_file))
+
+        return command
+
+    @staticmethod
+    def _format_timestamp(seconds: float):
+        """
+        Formats a time in the ffmpeg time duration syntax H:MM:SS.ffffff, which is exact to the microsecond
+        (see https://ffmpeg.org/ffmpeg-utils.html#time-duration-syntax)
+        :param seconds: Time in seconds (>= 0)
+        :return: Formatted time
+        """
+        # Rounding to whole microseconds first ensures that no component is formatted as 60
+        microseconds = round(seconds * 1_000_000)
+        hours, microseconds = divmod(microseconds, 3_600_000_000)
+        minutes, microseconds = divmod(microseconds, 60_000_000)
+        seconds, microseconds = divmod(microseconds, 1_000_000)
+
+        return f"{hours}:{minutes:02d}:{seconds:02d}.{microseconds:06d}"
+
+    @staticmethod
+    def _format_offset(seconds: float, start: float):
+        """
+        Formats a time relative to a start time as fixed-point seconds (ffmpeg does not parse exponent notation),
+        both are rounded to whole microseconds like in _format_timestamp() first
+        :param seconds: Time in seconds
+        :param start: Start time in seconds, the result is clamped to not be before it
+        :return: Formatted time offset
+        """
+        microseconds = max(0, round(seconds * 1_000_000) - round(start * 1_000_000))
+
+        return f"{microseconds / 1_000_000:.6f}"
+
+    @staticmethod
+    def clamp_speed(duration: float, speed: float, minimum_interval_duration=0.25):
+        if duration / speed < minimum_interval_duration:
+            return duration / minimum_interval_duration
+        else:
+            return speed
@@ -1,15 +1,16 @@
-import queue
+import asyncio
+import collections
+import concurrent.futures
+import os
 import shutil
 import subprocess
-import threading
-import time
 import uuid
 from os import PathLike
 from pathlib import Path
 from types import SimpleNamespace
 
 from unsilence.lib.intervals.Intervals import Intervals
-from unsilence.lib.render_media.RenderIntervalThread import RenderIntervalThread
+from unsilence.lib.render_media.IntervalRenderer import IntervalRenderer
 
 
 class MediaRenderer:
@@ -41,7 +42,13 @@ class MediaRenderer:
             audible_volume: The volume at which the audible intervals get played back at (float)
             silent_volume: The volume at which the silent intervals get played back at (float)
             drop_corrupted_intervals: Whether corrupted video intervals should be discarded or tried to recover (bool)
-            threads: Number of threads to render simultaneously (int > 0)
+            check_intervals: Whether ffmpeg should stop on any error (-xerror), so that invalid intervals are dropped
+                (bool)
+            threads: Number of ffmpeg processes to run simultaneously, defaults to the number of CPU cores (int > 0)
+            ffmpeg_threads: Number of threads every ffmpeg call may use, defaults to the CPU cores divided by the
+                number of simultaneous ffmpeg processes, so that the CPU is used completely without oversubscribing
+                it (int > 0)
+            debug: Whether ffmpeg should log warnings in addition to errors (bool)
             on_render_progress_update: Function that should be called on render progress update
                 (called like: func(current, total))
             on_concat_progress_update: Function that should be called on concat progress update
@@ -52,6 +59,43 @@ class MediaRenderer:
             interval_out_fade_duration:
             fade_curve:
         """
+        kwargs["batch_size"] = 1
+        self._run_coroutine(self.render_async(input_file, output_file, intervals, **kwargs))
+
+    def render_batched(self, input_file: str | PathLike, output_file: str | PathLike, intervals: Intervals, **kwargs):
+        """
+        Renders an input_file like render(), but processes a whole batch of intervals with a single ffmpeg call.
+        Every batch is cut, filtered and joined in one filter graph, so only one ffmpeg process is spawned (and the
+        input file is only opened once) per batch instead of once per interval. If all intervals fit into one batch,
+        no concat step is needed. A batch that could not be rendered (e.g. because of a corrupted part of the input)
+        is rendered interval by interval like in render() instead, so that the corrupted intervals can be handled
+        :param input_file: The file that should be processed
+        :param output_file: Where the processed file should be saved
+        :param intervals: The Intervals that should be processed
+        :param kwargs: Keyword Args, see render(), additionally:
+            batch_size: Maximum number of intervals that are rendered by one ffmpeg call (int > 0)
+        :raises: **ValueError** -- If batch_size is smaller than 1
+        :return: None
+        """
+        self._run_coroutine(self.render_async(input_file, output_file, intervals, **kwargs))
+
+    async def render_async(self, input_file: str | PathLike, output_file: str | PathLike, intervals: Intervals,
+                           **kwargs):
+        """
+        Coroutine that renders an input_file like render_batched(), all ffmpeg processes are run as asyncio
+        subprocesses by `threads` parallel workers
+        :param input_file: The file that should be processed
+        :param output_file: Where the processed file should be saved
+        :param intervals: The Intervals that should be processed
+        :param kwargs: Keyword Args, see render_batched(), batch_size=1 renders every interval with its own ffmpeg
+            call like render()
+        :raises: **ValueError** -- If batch_size is smaller than 1
+        :return: None
+        """
+        batch_size = kwargs.get("batch_size", 500)
+        if batch_size < 1:
+            raise ValueError("batch_size must be larger than 0")
+
         input_file = Path(input_file).absolute()
         output_file = Path(output_file).absolute()
 
@@ -70,6 +114,8 @@ class MediaRenderer:
             interval_in_fade_duration=kwargs.get("interval_in_fade_duration", 0.0),
             interval_out_fade_duration=kwargs.get("interval_out_fade_duration", 0.0),
             fade_curve=kwargs.get("fade_curve", "tri"),
+            ffmpeg_threads=kwargs.get("ffmpeg_threads", None),
+            debug=kwargs.get("debug", False),
         )
 
         intervals = intervals.remove_short_intervals_from_start(
@@ -83,57 +129,145 @@ class MediaRenderer:
         concat_file = video_temp_path / "concat_list.txt"
         final_output = video_temp_path / f"out_final{output_file.suffix}"
 
-        file_list = []
+        interval_list = intervals.intervals
+        batches = [interval_list[i:i + batch_size] for i in range(0, len(interval_list), batch_size)]
 
-        thread_lock = threading.Lock()
-        task_queue = queue.Queue()
-        thread_list = []
+        cpu_count = os.cpu_count() or 1
+
+        interval_renderer = IntervalRenderer(input_file, render_options)
         completed_tasks = []
         corrupted_intervals = []
+        # Tasks for the single intervals of batches that could not be rendered
+        fallback_tasks = []
+        rendered_intervals = 0
+        reported_intervals = 0
+        # Finished intervals of the batches that are currently rendered, by task id
+        task_progress = {}
+
+        async def render_task(task):
+            """
+            Nested coroutine that renders a task
+            :param task: The task that should be rendered
+            :return: None
+            """
+            nonlocal rendered_intervals
+
+            def update_task_progress(finished_intervals: int):
+                task_progress[task.task_id] = finished_intervals
+
+            completed = await interval_renderer.render_task(task, update_task_progress)
+            task_progress.pop(task.task_id, None)
+
+            if completed:
+                completed_tasks.append(task)
+                rendered_intervals += 1 if task.intervals is None else len(task.intervals)
+            elif task.intervals is not None:
+                # A batch can only fail as a whole, so its intervals are rendered one by one, which recovers (or drops)
+                # just the corrupted ones
+                fallback_tasks.extend(
+                    create_task(task.task_id + i, interval=interval) for i, interval in enumerate(task.intervals)
+                )
+            else:
+                corrupted_intervals.append(task)
 
-        def handle_thread_completed_task(completed_task, corrupted):
+        def report_progress():
             """
-            Nested function that is called when a thread completes it current task
-            :param completed_task: The completed task
-            :param corrupted: If the task contained a corrupted media part
+            Nested function that reports all intervals finished since the last call with a single progress update
             :return: None
             """
+            nonlocal reported_intervals
             func = kwargs.get("on_render_progress_update", None)
+            current_intervals = rendered_intervals + sum(task_progress.values())
 
-            thread_lock.acquire()
+            # The progress of a failed batch is discarded and its intervals are counted again when they are rendered one
+            # by one, so the reported progress is held until it is passed instead of moving backwards
+            if func is not None and current_intervals > reported_intervals:
+                reported_intervals = current_intervals
+                func(current_intervals, len(interval_list))
 
-            if not corrupted:
-                completed_tasks.append(completed_task)
-                if func is not None:
-                    func(len(completed_tasks), len(intervals.intervals))
-            else:
-                corrupted_intervals.append(completed_task)
+        async def report_progress_periodically():
+            """
+            Nested coroutine that reports the progress every 50ms, so that many short tasks finishing at once do not
+            cause a progress update (and redraw) each
+            :return: None
+            """
+            while True:
+                await asyncio.sleep(0.05)
+                report_progress()
 
-            thread_lock.release()
+        def create_task(task_id: int, interval=None, intervals=None):
+            """
+            Nested function that creates a task for a single interval or a batch of intervals
+            :param task_id: The index of the (first) interval of the task, so that the intervals of a failed batch get
+                ids between the ones of the surrounding batches
+            :param interval: The Interval that should be rendered on its own
+            :param intervals: The Intervals that should be rendered as a batch
+            :return: The task
+            """
+            return SimpleNamespace(
+                task_id=task_id,
+                interval_output_file=video_temp_path / f"out_{task_id}{output_file.suffix}",
+                interval=interval,
+                intervals=intervals,
+                filter_script_file=video_temp_path / f"out_{task_id}.filter",
+            )
+
+        if batch_size == 1:
+            task_list = [create_task(i, interval=interval) for i, interval in enumerate(interval_list)]
+        else:
+            task_list = [create_task(i * batch_size, intervals=batch) for i, batch in enumerate(batches)]
+
+        async def render_worker(own_queue: collections.deque):
+            """
+            Nested coroutine that renders the tasks of its own queue and helps the other workers afterwards
+            :param own_queue: The task queue of this worker
+            :return: None
+            """
+            while True:
+                if own_queue:
+                    task = own_queue.popleft()
+                else:
+                    fullest_queue = max(worker_queues, key=len)
+                    if not fullest_queue:
+                        return
+                    task = fullest_queue.pop()
 
-        for i in range(kwargs.get("threads", 2)):
-            thread = RenderIntervalThread(i, input_file, render_options, task_queue, thread_lock,
-                                          on_task_completed=handle_thread_completed_task)
-            thread.start()
-            thread_list.append(thread)
+                await render_task(task)
 
-        for i, interval in enumerate(intervals.intervals):
-            current_file_name = f"out_{i}{output_file.suffix}"
-            current_path = video_temp_path / current_file_name
+        progress_reporter = asyncio.create_task(report_progress_periodically())
 
-            file_list.append(current_path)
+        try:
+            # The intervals of failed batches are rendered in another round once all tasks of this round are done
+            while len(task_list) > 0:
+                worker_count = max(1, min(kwargs.get("threads", cpu_count), len(task_list)))
 
-            task = SimpleNamespace(task_id=i, interval_output_file=current_path, interval=interval)
+                if kwargs.get("ffmpeg_threads", None) is None:
+                    render_options.ffmpeg_threads = max(1, cpu_count // worker_count)
 
-            thread_lock.acquire()
-            task_queue.put(task)
-            thread_lock.release()
+                # Every worker gets its own queue of tasks (distributed round-robin). A worker that runs out of tasks
+                # steals from the back of the fullest queue, so no single shared queue has to be polled by all workers
+                worker_queues = [collections.deque(task_list[i::worker_count]) for i in range(worker_count)]
 
-        while len(completed_tasks) < (len(intervals.intervals) - len(corrupted_intervals)):
-            time.sleep(0.5)
+                await asyncio.gather(*(render_worker(worker_queue) for worker_queue in worker_queues))
 
-        for thread in thread_list:
-            thread.stop()
+                task_list = fallback_tasks
+                fallback_tasks = []
+        finally:
+            progress_reporter.cancel()
+
+        report_progress()
+
+        # A single batch that was rendered successfully already is the finished file, so the concat step is skipped
+        if len(batches) == 1 and len(completed_tasks) == 1 and completed_tasks[0].intervals is not None:
+            shutil.move(completed_tasks[0].interval_output_file, output_file)
+            shutil.rmtree(video_temp_path)
+
+            # There is nothing to combine, so the concat step is reported as done right away
+            update_concat_progress = kwargs.get("on_concat_progress_update", None)
+            if update_concat_progress is not None:
+                update_concat_progress(1, 1)
+
+            return
 
         completed_file_list = [task.interval_output_file for task in sorted(completed_tasks, key=lambda x: x.task_id)]
 
@@ -147,6 +281,22 @@ class MediaRenderer:
         shutil.move(final_output, output_file)
         shutil.rmtree(video_temp_path)
 
+    @staticmethod
+    def _run_coroutine(coroutine):
+        """
+        Runs a coroutine until it is finished, as asyncio.run() can not be called while an event loop is running in
+        the current thread (e.g. in Jupyter or an async application), it is run on a separate thread in that case
+        :param coroutine: The coroutine that should be run
+        :return: The result of the coroutine
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
     @staticmethod
     def _concat_intervals(file_list: list, concat_file: Path, output_file: Path, update_concat_progress):
         """
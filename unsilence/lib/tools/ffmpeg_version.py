@@ -1,8 +1,11 @@
+import functools
 import re
 import subprocess
 from pkg_resources import parse_version
 
 
+# The installed ffmpeg does not change while the program runs, so it only has to be checked once
+@functools.lru_cache(maxsize=1)
 def is_ffmpeg_usable():
     try:
         console_output = subprocess.run(